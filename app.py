@@ -1,70 +1,243 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import numpy as np
+import plotly.graph_objects as go
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import hashlib
+import io
+import multiprocessing
+import os
 import re
 
-def parse_chat(file_content):
-    """Parse WhatsApp chat file into a pandas DataFrame."""
-    # Updated pattern to match both date formats (M/D/YY and DD/MM/YYYY)
-    pattern = r'(\d{1,2}/\d{1,2}/\d{2,4}), (\d{2}:\d{2}) - ([^:]+): (.+)'
-    
-    messages = []
-    for line in file_content.split('\n'):
-        match = re.match(pattern, line)
-        if match:
-            try:
-                date, time, sender, message = match.groups()
-                # Try to parse date with different formats
-                try:
-                    # Try M/D/YY format first
-                    parsed_date = datetime.strptime(date, '%m/%d/%y')
-                except ValueError:
-                    try:
-                        # Try DD/MM/YYYY format as fallback
-                        parsed_date = datetime.strptime(date, '%d/%m/%Y')
-                    except ValueError:
-                        # Skip invalid dates
-                        continue
-                
-                messages.append({
-                    'date': parsed_date,
-                    'time': time,
-                    'sender': sender.strip(),
-                    'message': message
-                })
-            except ValueError as e:
-                st.warning(f"Skipped line due to parsing error: {line[:100]}...")
-                continue
-    
-    if not messages:
+# Matches both date formats (M/D/YY and DD/MM/YYYY); ASCII keeps \d to 0-9.
+# Applied to the whole chat at once, so ^ anchors at every line start.
+# The stdlib engine is deliberate: the pattern never backtracks far, and
+# google-re2's findall measured roughly 15x slower here on a 300k-line chat.
+_MSG_RE = re.compile(
+    r'^(\d{1,2})/(\d{1,2})/(\d{4}|\d{2}), (\d{2}:\d{2}) - ([^:\r\n]+): ([^\n]+)',
+    re.ASCII | re.MULTILINE
+)
+
+# Limits on how many points are sent to the browser per chart
+_MAX_PLOT_DAYS = 400
+_MAX_PLOT_PARTICIPANTS = 50
+_MAX_RAW_ROWS = 1000
+
+# Characters decoded per chunk while scanning an export
+_READ_CHARS = 1 << 20
+
+# Smallest slice of an export worth handing to a worker process; below this,
+# pickling the worker's results back costs about as much as the parse saves
+_SHARD_MIN_BYTES = 8_000_000
+
+def _parse_digits(values):
+    """Parse short ASCII digit strings from their code points; returns (numbers, widths)."""
+    # Fixed-width unicode arrays pad with NUL, so each column is one character position
+    codes = np.array(values).view(np.uint32).reshape(len(values), -1)
+    numbers = np.zeros(len(values), dtype=np.int64)
+    for col in codes.T:
+        numbers = np.where(col != 0, numbers * 10 + col - 48, numbers)
+    return numbers, (codes != 0).sum(axis=1)
+
+def _parse_dates(firsts, seconds, years):
+    """Build datetime64[D] dates from the captured date fields, NaT where invalid.
+
+    Two-digit years are read as M/D/YY (using strptime's %y century pivot) and
+    four-digit years as DD/MM/YYYY.
+    """
+    year, year_width = _parse_digits(years)
+    short = year_width == 2
+    year = np.where(short, year + np.where(year < 69, 2000, 1900), year)
+    first, _ = _parse_digits(firsts)
+    second, _ = _parse_digits(seconds)
+    month = np.where(short, first, second)
+    day = np.where(short, second, first)
+    
+    month_start = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    first_day = month_start.astype('datetime64[D]')
+    days_in_month = ((month_start + 1).astype('datetime64[D]') - first_day).astype(np.int64)
+    dates = first_day + (day - 1)
+    dates[(month < 1) | (month > 12) | (day < 1) | (day > days_in_month) | (year < 1)] = np.datetime64('NaT')
+    return dates
+
+def _parse_shard(raw):
+    """Parse a chunk of chat export bytes, ending on a line boundary, into an unsorted DataFrame."""
+    # Decode in line-aligned chunks so the full text is never held in memory at once;
+    # only matching lines are materialized
+    reader = io.TextIOWrapper(io.BytesIO(raw), encoding="utf-8", newline="\n")
+    matches = []
+    for chunk in iter(lambda: reader.read(_READ_CHARS), ''):
+        # Drop CRLF terminators only; a bare \r inside a message is kept
+        chunk = (chunk + reader.readline()).replace('\r\n', '\n')
+        matches.extend(_MSG_RE.findall(chunk))
+    if not matches:
         return None
-        
-    df = pd.DataFrame(messages)
+    
+    # Transpose the matches into one sequence per column
+    firsts, seconds, years, times, senders, messages = zip(*matches)
+    del matches
+    
+    dates = _parse_dates(firsts, seconds, years)
+    # Skip invalid dates
+    valid = ~np.isnat(dates)
+    if not valid.any():
+        return None
+    
+    times = np.array(times)[valid]
+    # time is always ASCII 'HH:MM', so read the hour digits straight from the code points
+    codes = times.view(np.uint32).reshape(-1, 5)
+    hours = ((codes[:, 0] - 48) * 10 + (codes[:, 1] - 48)).astype(np.int8)
+    
+    # Strip each distinct sender name once instead of every row
+    senders = pd.Categorical(np.array(senders, dtype=object)[valid])
+    names, name_codes = np.unique(senders.categories.str.strip(), return_inverse=True)
+    senders = pd.Categorical.from_codes(name_codes[senders.codes], names)
+    
+    return pd.DataFrame({
+        # Seconds are the coarsest datetime64 unit pandas stores
+        'date': dates[valid].astype('datetime64[s]'),
+        'time': times.astype(object),
+        'hour': hours,
+        'sender': senders,
+        'message': np.array(messages, dtype=object)[valid],
+    })
+
+def _split_lines(raw, n):
+    """Split bytes into at most n chunks that each end on a newline."""
+    step = len(raw) // n
+    shards = []
+    start = 0
+    for k in range(1, n):
+        end = raw.find(b'\n', max(start, k * step))
+        if end < 0:
+            break
+        shards.append(raw[start:end + 1])
+        start = end + 1
+    shards.append(raw[start:])
+    return shards
+
+def _parse_parallel(raw, workers):
+    """Parse shards of a large export in worker processes and stitch them together."""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        frames = [f for f in pool.map(_parse_shard, _split_lines(raw, workers)) if f is not None]
+    if not frames:
+        return None
+    df = pd.concat(frames, ignore_index=True)
+    # Shards have different sender categories, which concat falls back to object for
+    df['sender'] = df['sender'].astype('category')
+    return df
+
+def _parallel_workers(size):
+    """Number of worker processes to parse an export of size bytes with; 1 means in-process."""
+    # Only fork starts workers cheaply. Under spawn/forkserver every worker
+    # re-imports streamlit, pandas and plotly (~0.75s each), more than the parse costs
+    if multiprocessing.get_start_method() != 'fork':
+        return 1
+    if hasattr(os, 'sched_getaffinity'):
+        # cpu_count() reports every host core inside containers
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    return max(1, min(cpus, size // _SHARD_MIN_BYTES))
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def parse_chat(raw):
+    """Parse raw WhatsApp chat export bytes into a pandas DataFrame."""
+    workers = _parallel_workers(len(raw))
+    if workers > 1:
+        df = _parse_parallel(raw, workers)
+    else:
+        df = _parse_shard(raw)
+    
+    if df is None:
+        return None
+    # Sort once so analyze_chat can slice date ranges with searchsorted
+    df = df.sort_values('date', kind='stable', ignore_index=True)
+    # Lets analyze_chat's cache key on the upload instead of hashing the frame
+    df.attrs['source_hash'] = hashlib.sha1(raw).hexdigest()
     return df
 
+def _frame_key(df):
+    """Cache key for a chat frame: the hash of the export it was parsed from."""
+    source_hash = df.attrs.get('source_hash')
+    if source_hash is not None:
+        return source_hash
+    # Frames that did not come from parse_chat are hashed by content
+    return pd.util.hash_pandas_object(df, index=False).sum()
+
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: _frame_key})
 def analyze_chat(df, start_date=None, end_date=None):
     """Generate insights from the chat data."""
     if df is None or df.empty:
         return None, None, None
         
-    if start_date:
-        df = df[df['date'] >= start_date]
-    if end_date:
-        df = df[df['date'] <= end_date]
+    # df is sorted by date, so the range is a contiguous slice
+    i0 = df['date'].searchsorted(start_date, side='left') if start_date else 0
+    i1 = df['date'].searchsorted(end_date, side='right') if end_date else len(df)
+    sub = df.iloc[i0:i1]
     
     # Message count by participant
-    participant_stats = df['sender'].value_counts()
+    participant_stats = sub['sender'].value_counts()
+    # Categorical counts include senders outside the selected range
+    participant_stats = participant_stats[participant_stats > 0]
     
     # Most active days
-    daily_activity = df.groupby('date').size().sort_values(ascending=False)
+    daily_activity = sub['date'].value_counts()
     
     # Most active hours
-    df['hour'] = df['time'].str[:2].astype(int)
-    hourly_activity = df.groupby('hour').size()
+    hourly_activity = sub['hour'].value_counts().sort_index()
     
     return participant_stats, daily_activity, hourly_activity
 
+def build_figures(participant_stats, daily_activity, hourly_activity):
+    """Build the participant, daily and hourly activity charts."""
+    # Participant Rankings
+    # Keep the bar chart readable and its payload small for very large groups
+    top_participants = participant_stats.head(_MAX_PLOT_PARTICIPANTS)
+    fig_participants = go.Figure(go.Bar(
+        x=top_participants.index.astype(str),
+        y=top_participants.values
+    ))
+    fig_participants.update_layout(
+        title="Messages per Participant",
+        xaxis_title="Participant",
+        yaxis_title="Number of Messages"
+    )
+    
+    # Daily Activity
+    # Plot in date order, binned by week when there are too many days to ship
+    plot_daily = daily_activity.sort_index()
+    daily_title = "Messages per Day"
+    if len(plot_daily) > _MAX_PLOT_DAYS:
+        plot_daily = plot_daily.resample('W').sum()
+        daily_title = "Messages per Week"
+    fig_daily = go.Figure(go.Scatter(
+        x=plot_daily.index,
+        y=plot_daily.values,
+        mode='lines'
+    ))
+    fig_daily.update_layout(
+        title=daily_title,
+        xaxis_title="Date",
+        yaxis_title="Number of Messages"
+    )
+    
+    # Hourly Activity
+    fig_hourly = go.Figure(go.Bar(
+        x=hourly_activity.index,
+        y=hourly_activity.values,
+        text=hourly_activity.values,  # Show values on bars
+        textposition='outside'
+    ))
+    fig_hourly.update_layout(
+        title="Messages by Hour of Day",
+        xaxis_title="Hour",
+        yaxis_title="Number of Messages"
+    )
+    
+    return fig_participants, fig_daily, fig_hourly
+
 def main():
     st.title("WhatsApp Chat Analyzer")
     
@@ -82,8 +255,7 @@ def main():
     if uploaded_file is not None:
         try:
             # Read and parse chat
-            content = uploaded_file.getvalue().decode("utf-8")
-            df = parse_chat(content)
+            df = parse_chat(uploaded_file.getvalue())
             
             if df is None or df.empty:
                 st.error("No valid messages found in the file. Please check the file format.")
@@ -91,8 +263,9 @@ def main():
                 
             # Date filter
             st.sidebar.header("Filters")
-            min_date = df['date'].min()
-            max_date = df['date'].max()
+            # Dates are sorted datetime64 values; hand plain dates to the widgets
+            min_date = df['date'].iloc[0].date()
+            max_date = df['date'].iloc[-1].date()
             
             start_date = st.sidebar.date_input("Start Date", min_date)
             end_date = st.sidebar.date_input("End Date", max_date)
@@ -118,40 +291,31 @@ def main():
             with col2:
                 st.metric("Total Participants", len(participant_stats))
             with col3:
-                st.metric("Date Range", f"{min_date.date()} to {max_date.date()}")
+                st.metric("Date Range", f"{min_date} to {max_date}")
+            
+            # Figures are rebuilt only when the file or date range changes, not on
+            # every rerun (e.g. toggling the raw data checkbox)
+            figs_key = (df.attrs['source_hash'], start_date, end_date)
+            if st.session_state.get('figs_key') != figs_key:
+                st.session_state.figs = build_figures(participant_stats, daily_activity, hourly_activity)
+                st.session_state.figs_key = figs_key
+            fig_participants, fig_daily, fig_hourly = st.session_state.figs
             
-            # Participant Rankings
             st.subheader("Most Active Participants")
-            fig_participants = px.bar(
-                participant_stats,
-                title="Messages per Participant",
-                labels={'value': 'Number of Messages', 'index': 'Participant'}
-            )
             st.plotly_chart(fig_participants, use_container_width=True)
             
-            # Daily Activity
             st.subheader("Daily Activity")
-            fig_daily = px.line(
-                daily_activity,
-                title="Messages per Day",
-                labels={'value': 'Number of Messages', 'index': 'Date'}
-            )
             st.plotly_chart(fig_daily, use_container_width=True)
             
-            # Hourly Activity
             st.subheader("Hourly Activity")
-            fig_hourly = px.bar(
-                hourly_activity,
-                title="Messages by Hour of Day",
-                labels={'value': 'Number of Messages', 'index': 'Hour'},
-                text='value'  # Show values on bars
-            )
-            fig_hourly.update_traces(textposition='outside')
             st.plotly_chart(fig_hourly, use_container_width=True)
             
             # Show raw data option
             if st.checkbox("Show raw data"):
-                st.dataframe(df)
+                # Only ship the first rows to the browser
+                st.dataframe(df.head(_MAX_RAW_ROWS))
+                if len(df) > _MAX_RAW_ROWS:
+                    st.caption(f"Showing the first {_MAX_RAW_ROWS:,} of {len(df):,} messages.")
                 
         except Exception as e:
             st.error(f"An error occurred while processing the file: {str(e)}")